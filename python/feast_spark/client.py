@@ -1,32 +1,52 @@
-import os
+import copy
+import itertools
+import json
+import threading
+import time
 import uuid
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from itertools import groupby
-from typing import TYPE_CHECKING, List, Optional, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
+import grpc
 import pandas as pd
 
 import feast
 from feast.constants import ConfigOptions as opt
+from feast.core.JobService_pb2 import GetHistoricalFeaturesRequest, GetJobRequest
+from feast.core.JobService_pb2 import Job as JobProto
 from feast.core.JobService_pb2 import (
-    GetHistoricalFeaturesRequest,
-    GetJobRequest,
     ListJobsRequest,
     StartOfflineToOnlineIngestionJobRequest,
     StartStreamToOnlineIngestionJobRequest,
 )
 from feast.core.JobService_pb2_grpc import JobServiceStub
 from feast.data_source import BigQuerySource, FileSource
-from feast.grpc.grpc import create_grpc_channel
-from feast.staging.entities import (
-    stage_entities_to_bq,
-    stage_entities_to_fs,
-    table_reference_from_string,
+from feast.staging.entities import stage_entities_to_bq, table_reference_from_string
+from feast_spark.constants import (
+    DEFAULT_FEATURE_TABLE_CACHE_TTL_SECONDS,
+    DEFAULT_JOB_SERVICE_CHANNEL_POOL_SIZE,
+    DEFAULT_JOB_SERVICE_LONG_CALL_TIMEOUT_SECONDS,
 )
+from feast_spark.constants import ConfigOptions as spark_opt
 from feast_spark.pyspark.abc import RetrievalJob, SparkJob
 from feast_spark.pyspark.launcher import (
     get_job_by_id,
     list_jobs,
+    stage_dataframe,
     start_historical_feature_retrieval_job,
     start_historical_feature_retrieval_spark_session,
     start_offline_to_online_ingestion,
@@ -42,26 +62,200 @@ from feast_spark.remote_job import (
 if TYPE_CHECKING:
     from feast.config import Config
 
+MAX_FEATURE_TABLE_FETCH_WORKERS = 16
+
+# Retry Job Service calls that failed because the service was temporarily unavailable.
+# Only idempotent calls are retried, a retried start could launch a duplicate job.
+JOB_SERVICE_GRPC_SERVICE_CONFIG = json.dumps(
+    {
+        "methodConfig": [
+            {
+                "name": [
+                    {"service": "feast.core.JobService", "method": method}
+                    for method in ("GetJob", "ListJobs", "CancelJob")
+                ],
+                "retryPolicy": {
+                    "maxAttempts": 4,
+                    "initialBackoff": "0.1s",
+                    "maxBackoff": "2s",
+                    "backoffMultiplier": 2,
+                    "retryableStatusCodes": ["UNAVAILABLE"],
+                },
+            }
+        ]
+    }
+)
+
+
+T = TypeVar("T")
+
+
+def _future_from_grpc(
+    grpc_future: grpc.Future, convert: Callable[[Any], T]
+) -> "Future[T]":
+    """
+    Returns a Future resolving to the converted response of a non-blocking gRPC call.
+    """
+    future: "Future[T]" = Future()
+
+    def on_cancelled(done: "Future[T]"):
+        if done.cancelled():
+            grpc_future.cancel()
+
+    def on_done(completed: grpc.Future):
+        # Marks the future as running, unless the caller has already cancelled it
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(convert(completed.result()))
+        except Exception as e:
+            future.set_exception(e)
+
+    future.add_done_callback(on_cancelled)
+    grpc_future.add_done_callback(on_done)
+    return future
+
+
+def _future_from_call(fn: Callable[[], T]) -> "Future[T]":
+    """
+    Returns an already resolved Future holding the result (or the exception) of fn.
+    """
+    future: "Future[T]" = Future()
+    try:
+        future.set_result(fn())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _create_grpc_channel(
+    url: str,
+    enable_ssl: bool = False,
+    enable_auth: bool = False,
+    ssl_server_cert_path: Optional[str] = None,
+    auth_metadata_plugin: Optional[grpc.AuthMetadataPlugin] = None,
+    timeout: int = 3,
+    options: Optional[List[Tuple[str, Any]]] = None,
+) -> grpc.Channel:
+    """
+    Same as feast.grpc.grpc.create_grpc_channel, but allows to pass channel options.
+
+    Returns:
+        Returns a grpc Channel that is ready to serve requests
+    """
+    if enable_ssl or url.endswith(":443"):
+        if ssl_server_cert_path:
+            with open(ssl_server_cert_path, "rb") as f:
+                credentials = grpc.ssl_channel_credentials(f.read())
+        else:
+            credentials = grpc.ssl_channel_credentials()
+
+        if enable_auth:
+            credentials = grpc.composite_channel_credentials(
+                credentials, grpc.metadata_call_credentials(auth_metadata_plugin),
+            )
+        channel = grpc.secure_channel(url, credentials=credentials, options=options)
+    else:
+        channel = grpc.insecure_channel(url, options=options)
+
+    try:
+        grpc.channel_ready_future(channel).result(timeout=timeout)
+        return channel
+    except grpc.FutureTimeoutError:
+        channel.close()
+        raise ConnectionError(
+            f"Connection timed out while attempting to connect to {url}"
+        )
+
 
 class Client:
     _feast: feast.Client
 
-    def __init__(self, feast_client: feast.Client):
+    def __init__(self, feast_client: feast.Client, eager_connect: bool = False):
+        """
+        Args:
+            feast_client: Feast client used to access Feast Core and the configuration
+            eager_connect: Connect to the Job Service (if enabled) right away, instead of
+                on the first call, so that the first call doesn't pay for establishing
+                the connections
+        """
         self._feast = feast_client
-        self._job_service_stub: Optional[JobServiceStub] = None
+        self._job_service_stubs: List[JobServiceStub] = []
+        self._job_service_stub_counter = itertools.count()
+        self._job_service_lock = threading.Lock()
+        self._feature_table_cache: Dict[
+            Tuple[Optional[str], str], Tuple[float, feast.FeatureTable]
+        ] = {}
+        self._config_cache: Dict[str, Any] = {}
+
+        if eager_connect and self._use_job_service:
+            self._connect_job_service()
 
     @property
     def config(self) -> "Config":
         return self._feast._config
 
-    @property
-    def _extra_grpc_params(self):
-        return self._feast._extra_grpc_params
+    def _extra_grpc_params(self) -> Dict[str, Any]:
+        """
+        Parameters passed to Job Service calls that are answered quickly
+        (eg. job status): the feast client's ones (eg. auth metadata)
+        and a deadline, so that calls never block indefinitely.
+
+        The feast client already sets timeout to grpc_connection_timeout;
+        it is overridden here with the same value, read from the cached
+        config instead of the feast Config on every call.
+        """
+        return dict(
+            self._feast._extra_grpc_params(),
+            timeout=int(self._get_cached_config(opt.GRPC_CONNECTION_TIMEOUT)),
+        )
+
+    def _long_call_grpc_params(self) -> Dict[str, Any]:
+        """
+        Same as _extra_grpc_params, but with a longer deadline for calls the Job Service
+        handles synchronously: starting a job (which may upload the ingestion jar and
+        submit it to the cluster) and listing jobs.
+        """
+        return dict(
+            self._extra_grpc_params(),
+            timeout=int(
+                self._get_cached_config(
+                    spark_opt.JOB_SERVICE_LONG_CALL_TIMEOUT_SECONDS,
+                    default=DEFAULT_JOB_SERVICE_LONG_CALL_TIMEOUT_SECONDS,
+                )
+            ),
+        )
 
     @property
     def feature_store(self) -> feast.Client:
         return self._feast
 
+    def _get_cached_config(self, option: str, **kwargs) -> Any:
+        """
+        Returns the value of a config option that is read on every request.
+        It is looked up only once, so later changes to the config are not picked up.
+        """
+        if option not in self._config_cache:
+            self._config_cache[option] = self.config.get(option, **kwargs)
+        return self._config_cache[option]
+
+    @property
+    def _output_location_prefix(self) -> str:
+        return self._get_cached_config(opt.HISTORICAL_FEATURE_OUTPUT_LOCATION)
+
+    @property
+    def _output_format(self) -> str:
+        return self._get_cached_config(opt.HISTORICAL_FEATURE_OUTPUT_FORMAT)
+
+    @property
+    def _feature_table_cache_ttl(self) -> int:
+        return int(
+            self._get_cached_config(
+                spark_opt.FEATURE_TABLE_CACHE_TTL_SECONDS,
+                default=DEFAULT_FEATURE_TABLE_CACHE_TTL_SECONDS,
+            )
+        )
+
     @property
     def _use_job_service(self) -> bool:
         return self.config.exists(opt.JOB_SERVICE_URL)
@@ -69,7 +263,11 @@ class Client:
     @property
     def _job_service(self):
         """
-        Creates or returns the gRPC Feast Job Service Stub
+        Creates or returns the gRPC Feast Job Service Stub.
+
+        Stubs are handed out round-robin from a pool of channels, so that
+        concurrent calls are not limited by the number of concurrent streams
+        of a single HTTP/2 connection.
 
         Returns: JobServiceStub
         """
@@ -77,17 +275,68 @@ class Client:
         if not self._use_job_service:
             return None
 
-        if not self._job_service_stub:
-            channel = create_grpc_channel(
-                url=self.config.get(opt.JOB_SERVICE_URL),
-                enable_ssl=self.config.getboolean(opt.JOB_SERVICE_ENABLE_SSL),
-                enable_auth=self.config.getboolean(opt.ENABLE_AUTH),
-                ssl_server_cert_path=self.config.get(opt.JOB_SERVICE_SERVER_SSL_CERT),
-                auth_metadata_plugin=self._feast._auth_metadata,
-                timeout=self.config.getint(opt.GRPC_CONNECTION_TIMEOUT),
+        self._connect_job_service()
+
+        # next() on itertools.count is atomic, so concurrent callers get distinct stubs
+        stub_index = next(self._job_service_stub_counter)
+        return self._job_service_stubs[stub_index % len(self._job_service_stubs)]
+
+    def _connect_job_service(self):
+        """
+        Creates the pool of Job Service channels, unless it already exists.
+        """
+        if self._job_service_stubs:
+            return
+
+        # The client may be shared between threads,
+        # make sure the channels are created only once
+        with self._job_service_lock:
+            if self._job_service_stubs:
+                return
+
+            pool_size = max(
+                self.config.getint(
+                    spark_opt.JOB_SERVICE_CHANNEL_POOL_SIZE,
+                    default=DEFAULT_JOB_SERVICE_CHANNEL_POOL_SIZE,
+                ),
+                1,
             )
-            self._job_service_service_stub = JobServiceStub(channel)
-        return self._job_service_service_stub
+            # Creating a channel blocks until it is connected, so connect them in parallel
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                pending_channels = [
+                    executor.submit(self._create_job_service_channel, channel_id)
+                    for channel_id in range(pool_size)
+                ]
+
+            errors = [f.exception() for f in pending_channels if f.exception()]
+            if errors:
+                # Don't leak the channels that did connect
+                for f in pending_channels:
+                    if not f.exception():
+                        f.result().close()
+                raise errors[0]
+
+            self._job_service_stubs = [
+                JobServiceStub(f.result()) for f in pending_channels
+            ]
+
+    def _create_job_service_channel(self, channel_id: int) -> grpc.Channel:
+        # Channels with identical arguments share the underlying connection
+        # (subchannel), so every pooled channel gets its own id and subchannel pool
+        return _create_grpc_channel(
+            url=self.config.get(opt.JOB_SERVICE_URL),
+            enable_ssl=self.config.getboolean(opt.JOB_SERVICE_ENABLE_SSL),
+            enable_auth=self.config.getboolean(opt.ENABLE_AUTH),
+            ssl_server_cert_path=self.config.get(opt.JOB_SERVICE_SERVER_SSL_CERT),
+            auth_metadata_plugin=self._feast._auth_metadata,
+            timeout=self.config.getint(opt.GRPC_CONNECTION_TIMEOUT),
+            options=[
+                ("grpc.channel_id", channel_id),
+                ("grpc.use_local_subchannel_pool", 1),
+                ("grpc.enable_retries", 1),
+                ("grpc.service_config", JOB_SERVICE_GRPC_SERVICE_CONFIG),
+            ],
+        )
 
     def get_historical_features(
         self,
@@ -106,7 +355,8 @@ class Client:
             entity_source (Union[pd.DataFrame, FileSource, BigQuerySource]): Source for the entity rows.
                 If entity_source is a Panda DataFrame, the dataframe will be staged
                 to become accessible by spark workers.
-                If one of feature tables' source is in BigQuery - entities will be upload to BQ.
+                If one of feature tables' source is in BigQuery - entities will be uploaded to BQ
+                with a single load job.
                 Otherwise to remote file storage (derived from configured staging location).
                 It is also assumed that the column event_timestamp is present
                 in the dataframe, and is of type datetime without timezone information.
@@ -137,29 +387,22 @@ class Client:
             feature_refs, self._feast.project
         )
 
-        assert all(ft.batch_source.created_timestamp_column for ft in feature_tables), (
-            "All BatchSources attached to retrieved FeatureTables "
-            "must have specified `created_timestamp_column` to be used in "
-            "historical dataset generation."
-        )
-
         if output_location is None:
-            output_location = os.path.join(
-                self.config.get(opt.HISTORICAL_FEATURE_OUTPUT_LOCATION),
-                str(uuid.uuid4()),
+            output_location = (
+                f"{self._output_location_prefix.rstrip('/')}/{uuid.uuid4().hex}"
             )
-        output_format = self.config.get(opt.HISTORICAL_FEATURE_OUTPUT_FORMAT)
-        feature_sources = [
-            feature_table.batch_source for feature_table in feature_tables
-        ]
+        output_format = self._output_format
 
         if isinstance(entity_source, pd.DataFrame):
-            if any(isinstance(source, BigQuerySource) for source in feature_sources):
-                first_bq_source = [
-                    source
-                    for source in feature_sources
-                    if isinstance(source, BigQuerySource)
-                ][0]
+            first_bq_source = next(
+                (
+                    feature_table.batch_source
+                    for feature_table in feature_tables
+                    if isinstance(feature_table.batch_source, BigQuerySource)
+                ),
+                None,
+            )
+            if first_bq_source is not None:
                 source_ref = table_reference_from_string(
                     first_bq_source.bigquery_options.table_ref
                 )
@@ -167,9 +410,12 @@ class Client:
                     entity_source, source_ref.project, source_ref.dataset_id
                 )
             else:
-                entity_source = stage_entities_to_fs(
+                entity_source["event_timestamp"] = entity_source[
+                    "event_timestamp"
+                ].dt.floor("ms")
+                entity_source = stage_dataframe(
                     entity_source,
-                    staging_location=self.config.get(opt.SPARK_STAGING_LOCATION),
+                    event_timestamp_column="event_timestamp",
                     config=self.config,
                 )
 
@@ -182,7 +428,7 @@ class Client:
                     output_format=output_format,
                     output_location=output_location,
                 ),
-                **self._feast._extra_grpc_params(),
+                **self._long_call_grpc_params(),
             )
             return RemoteRetrievalJob(
                 self._job_service,
@@ -245,23 +491,81 @@ class Client:
     def _get_feature_tables_from_feature_refs(
         self, feature_refs: List[str], project: Optional[str]
     ):
-        feature_refs_grouped_by_table = [
-            (feature_table_name, list(grouped_feature_refs))
-            for feature_table_name, grouped_feature_refs in groupby(
-                feature_refs, lambda x: x.split(":")[0]
-            )
-        ]
+        feature_names_grouped_by_table: Dict[str, List[str]] = defaultdict(list)
+        for feature_ref in feature_refs:
+            feature_table_name, _, feature_name = feature_ref.partition(":")
+            feature_names_grouped_by_table[feature_table_name].append(feature_name)
+
+        def fetch_feature_table(item: Tuple[str, List[str]]) -> feast.FeatureTable:
+            feature_table_name, feature_names = item
+            return self._get_feature_table(feature_table_name, project, feature_names)
+
+        if len(feature_names_grouped_by_table) <= 1:
+            fetched_feature_tables = [
+                fetch_feature_table(item)
+                for item in feature_names_grouped_by_table.items()
+            ]
+        else:
+            # feast.Client creates its Core stub lazily and without a lock,
+            # create it before fanning out, so that threads don't each open a channel
+            self._feast._core_service
+
+            # Lookups are independent round-trips to Feast Core, so run them concurrently
+            with ThreadPoolExecutor(
+                max_workers=min(
+                    len(feature_names_grouped_by_table), MAX_FEATURE_TABLE_FETCH_WORKERS
+                )
+            ) as executor:
+                fetched_feature_tables = list(
+                    executor.map(
+                        fetch_feature_table, feature_names_grouped_by_table.items()
+                    )
+                )
 
         feature_tables = []
-        for feature_table_name, grouped_feature_refs in feature_refs_grouped_by_table:
-            feature_table = self._feast.get_feature_table(feature_table_name, project)
-            feature_names = [f.split(":")[-1] for f in grouped_feature_refs]
+        for fetched_feature_table, feature_names in zip(
+            fetched_feature_tables, feature_names_grouped_by_table.values()
+        ):
+            if not fetched_feature_table.batch_source.created_timestamp_column:
+                raise ValueError(
+                    f"BatchSource of FeatureTable {fetched_feature_table.name} "
+                    "must have specified `created_timestamp_column` to be used in "
+                    "historical dataset generation."
+                )
+            requested_feature_names = set(feature_names)
+            feature_table = copy.copy(fetched_feature_table)
             feature_table.features = [
-                f for f in feature_table.features if f.name in feature_names
+                f for f in feature_table.features if f.name in requested_feature_names
             ]
             feature_tables.append(feature_table)
         return feature_tables
 
+    def _get_feature_table(
+        self, name: str, project: Optional[str], feature_names: List[str]
+    ) -> feast.FeatureTable:
+        """
+        Returns the FeatureTable from Feast Core, reusing a previously fetched one
+        if it is younger than the configured cache TTL and contains all requested features.
+        The returned object is shared between calls and must not be mutated.
+        """
+        ttl = self._feature_table_cache_ttl
+        cached = self._feature_table_cache.get((project, name))
+        if cached is not None:
+            fetched_at, feature_table = cached
+            cached_feature_names = {f.name for f in feature_table.features}
+            if time.monotonic() - fetched_at < ttl and all(
+                feature_name in cached_feature_names for feature_name in feature_names
+            ):
+                return feature_table
+
+        feature_table = self._feast.get_feature_table(name, project)
+        if ttl > 0:
+            self._feature_table_cache[(project, name)] = (
+                time.monotonic(),
+                feature_table,
+            )
+        return feature_table
+
     def start_offline_to_online_ingestion(
         self, feature_table: feast.FeatureTable, start: datetime, end: datetime,
     ) -> SparkJob:
@@ -288,7 +592,9 @@ class Client:
             )
             request.start_date.FromDatetime(start)
             request.end_date.FromDatetime(end)
-            response = self._job_service.StartOfflineToOnlineIngestionJob(request)
+            response = self._job_service.StartOfflineToOnlineIngestionJob(
+                request, **self._long_call_grpc_params()
+            )
             return RemoteBatchIngestionJob(
                 self._job_service,
                 self._extra_grpc_params,
@@ -302,20 +608,25 @@ class Client:
         self,
         feature_table: feast.FeatureTable,
         extra_jars: Optional[List[str]] = None,
-        project: str = None,
+        project: Optional[str] = None,
     ) -> SparkJob:
+        if project is None:
+            project = self._feast.project
+
         if not self._use_job_service:
             return start_stream_to_online_ingestion(
                 client=self,
-                project=project or self._feast.project,
+                project=project,
                 feature_table=feature_table,
-                extra_jars=extra_jars or [],
+                extra_jars=extra_jars if extra_jars is not None else [],
             )
         else:
             request = StartStreamToOnlineIngestionJobRequest(
-                project=self._feast.project, table_name=feature_table.name,
+                project=project, table_name=feature_table.name,
+            )
+            response = self._job_service.StartStreamToOnlineIngestionJob(
+                request, **self._long_call_grpc_params()
             )
-            response = self._job_service.StartStreamToOnlineIngestionJob(request)
             return RemoteStreamIngestionJob(
                 self._job_service,
                 self._extra_grpc_params,
@@ -328,26 +639,78 @@ class Client:
     def list_jobs(
         self, include_terminated: bool, table_name: Optional[str] = None
     ) -> List[SparkJob]:
+        return list(self.iter_jobs(include_terminated, table_name))
+
+    def iter_jobs(
+        self, include_terminated: bool, table_name: Optional[str] = None
+    ) -> Iterator[SparkJob]:
+        """
+        Same as list_jobs, but job objects are created lazily while iterating,
+        so callers that stop early don't pay for the remaining jobs.
+        """
         if not self._use_job_service:
-            return list_jobs(include_terminated, self, table_name)
+            yield from list_jobs(include_terminated, self, table_name)
         else:
             request = ListJobsRequest(
                 include_terminated=include_terminated, table_name=table_name
             )
-            response = self._job_service.ListJobs(request)
-            return [
-                get_remote_job_from_proto(
-                    self._job_service, self._feast._extra_grpc_params, job
-                )
-                for job in response.jobs
-            ]
+            job_service = self._job_service
+            response = job_service.ListJobs(request, **self._long_call_grpc_params())
+            yield from self._remote_jobs_from_proto(job_service, response.jobs)
+
+    def _remote_jobs_from_proto(
+        self, job_service: JobServiceStub, jobs: Iterable[JobProto]
+    ) -> Iterator[SparkJob]:
+        for job in jobs:
+            yield get_remote_job_from_proto(job_service, self._extra_grpc_params, job)
 
     def get_job_by_id(self, job_id: str) -> SparkJob:
         if not self._use_job_service:
             return get_job_by_id(job_id, self)
         else:
             request = GetJobRequest(job_id=job_id)
-            response = self._job_service.GetJob(request)
+            response = self._job_service.GetJob(request, **self._extra_grpc_params())
             return get_remote_job_from_proto(
-                self._job_service, self._feast._extra_grpc_params, response.job
+                self._job_service, self._extra_grpc_params, response.job
             )
+
+    def list_jobs_async(
+        self, include_terminated: bool, table_name: Optional[str] = None
+    ) -> "Future[List[SparkJob]]":
+        """
+        Non-blocking version of list_jobs. With the Job Service the call is issued
+        right away and the returned Future is resolved when the response arrives,
+        so many calls can be in flight without a thread per call.
+        Without the Job Service the jobs are listed synchronously.
+        """
+        if not self._use_job_service:
+            return _future_from_call(
+                lambda: list_jobs(include_terminated, self, table_name)
+            )
+
+        request = ListJobsRequest(
+            include_terminated=include_terminated, table_name=table_name
+        )
+        job_service = self._job_service
+        return _future_from_grpc(
+            job_service.ListJobs.future(request, **self._long_call_grpc_params()),
+            lambda response: list(
+                self._remote_jobs_from_proto(job_service, response.jobs)
+            ),
+        )
+
+    def get_job_by_id_async(self, job_id: str) -> "Future[SparkJob]":
+        """
+        Non-blocking version of get_job_by_id, see list_jobs_async.
+        """
+        if not self._use_job_service:
+            return _future_from_call(lambda: get_job_by_id(job_id, self))
+
+        request = GetJobRequest(job_id=job_id)
+        job_service = self._job_service
+        return _future_from_grpc(
+            job_service.GetJob.future(request, **self._extra_grpc_params()),
+            lambda response: get_remote_job_from_proto(
+                job_service, self._extra_grpc_params, response.job
+            ),
+        )
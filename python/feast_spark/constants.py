@@ -0,0 +1,27 @@
+class ConfigOptions:
+    """
+    Feast Spark specific configuration options. They complement
+    feast.constants.ConfigOptions and are read through the same feast Config,
+    so they can be set in the config file or as FEAST_* environment variables.
+    """
+
+    #: Number of seconds a FeatureTable fetched from Feast Core is reused by
+    #: the client before it is fetched again. Disabled (0) by default.
+    #: While cached, changes applied to a table (batch source, field mapping,
+    #: entities, removed features) are not seen by the client, including by a
+    #: long-running Job Service. Only newly added features trigger a refetch.
+    FEATURE_TABLE_CACHE_TTL_SECONDS: str = "feature_table_cache_ttl_seconds"
+
+    #: Number of gRPC channels the client opens to the Job Service.
+    #: Calls are distributed round-robin across them.
+    JOB_SERVICE_CHANNEL_POOL_SIZE: str = "job_service_channel_pool_size"
+
+    #: Deadline in seconds for Job Service calls that start jobs or list them.
+    #: The service handles these synchronously, eg. uploading the ingestion jar
+    #: and submitting the job, so they take longer than grpc_connection_timeout.
+    JOB_SERVICE_LONG_CALL_TIMEOUT_SECONDS: str = "job_service_long_call_timeout_seconds"
+
+
+DEFAULT_FEATURE_TABLE_CACHE_TTL_SECONDS = 0
+DEFAULT_JOB_SERVICE_CHANNEL_POOL_SIZE = 4
+DEFAULT_JOB_SERVICE_LONG_CALL_TIMEOUT_SECONDS = 600
@@ -344,11 +344,21 @@ def stage_dataframe(df, event_timestamp_column: str, config: Config) -> FileSour
         event_timestamp_column(str): the name of the timestamp column in the dataframe.
         config(Config): feast config.
     """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
     staging_location = config.get(opt.SPARK_STAGING_LOCATION)
     staging_uri = urlparse(staging_location)
 
     with tempfile.NamedTemporaryFile() as f:
-        df.to_parquet(f)
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=None),
+            f,
+            compression="snappy",
+            use_dictionary=True,
+            row_group_size=1_000_000,
+        )
+        f.flush()
 
         file_url = urlunparse(
             get_staging_client(staging_uri.scheme, config).upload_fileobj(